@@ -1,13 +1,578 @@
 import json
 import time
 import io
+import os
+import gc
 import sys
+import queue
+import tracemalloc
+import hashlib
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from multiprocessing import shared_memory
 from pathlib import Path
 from datetime import datetime
 import keyboard
 from PIL import ImageGrab, Image
 import requests
 import base64
+import math
+
+try:
+    # 可选依赖：增量上传时的图块比较
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    # 可选依赖：内存统计中输出进程 RSS
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    # 可选依赖：文件夹监听（基于系统文件事件，无需轮询）
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+    try:
+        # 较新的 watchdog 在 Linux 上提供写入完成（IN_CLOSE_WRITE）事件
+        from watchdog.events import FileClosedEvent
+    except ImportError:
+        FileClosedEvent = None
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+    FileClosedEvent = None
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """端点熔断中，快速失败"""
+
+
+class EndpointMonitor:
+    """单个端点的延迟统计与熔断器"""
+
+    def __init__(self, name, window=50, failure_threshold=3, reset_timeout=30, default_p95=2.0):
+        self.name = name
+        self.latencies = deque(maxlen=window)
+        # 样本不足时使用的 p95 估计值，对冲请求从第一次调用起就能生效
+        self.default_p95 = default_p95
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.open_until = 0
+        self.lock = threading.Lock()
+
+    def observed_p95(self):
+        """最近窗口内实际观测到的 p95 延迟（秒），样本不足时返回 None"""
+        with self.lock:
+            if len(self.latencies) < 5:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    
+    def p95(self):
+        """p95 延迟（秒），样本不足时返回默认估计值"""
+        observed = self.observed_p95()
+        return observed if observed is not None else self.default_p95
+
+    def allow_request(self):
+        """熔断打开期间拒绝请求，超时后放行（半开状态）"""
+        with self.lock:
+            return time.monotonic() >= self.open_until
+
+    def record_success(self, elapsed):
+        with self.lock:
+            self.latencies.append(elapsed)
+            self.failures = 0
+            self.open_until = 0
+
+    def record_slow(self):
+        """
+        请求成功但远超 p95：按失败计数（冷启动卡顿也应触发熔断）
+        
+        不计入延迟样本，否则一次卡顿就会抬高 p95，掩盖之后的卡顿
+        """
+        return self.record_failure()
+    
+    def record_failure(self):
+        """记录失败，连续失败达到阈值时打开熔断"""
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.open_until = time.monotonic() + self.reset_timeout
+                return True
+            return False
+
+
+class CaptureSource:
+    """图片来源基类：产生的图片统一交给 emit 进入编码/上传流程"""
+    
+    name = 'source'
+    
+    def __init__(self, uploader, emit):
+        self.uploader = uploader
+        self.emit = emit
+    
+    def start(self):
+        raise NotImplementedError
+    
+    def stop(self):
+        pass
+
+
+class HotkeySource(CaptureSource):
+    """热键截全屏"""
+    
+    name = 'hotkey'
+    
+    def start(self):
+        hotkey = self.uploader.config.get('hotkey', 'f9')
+        keyboard.add_hotkey(hotkey, self.on_hotkey)
+        print(f"⌨️  已注册热键: {hotkey.upper()}，按下即截图上传")
+    
+    def on_hotkey(self):
+        # 按下时立即截图，保证内容与按键时刻一致
+        capture_time = time.monotonic()
+        screenshot = self.uploader.take_screenshot()
+        if screenshot:
+            self.emit(self.name, lambda: screenshot, capture_time)
+
+
+class ClipboardSource(CaptureSource):
+    """剪贴板图片（如截图工具复制的图片），内容不变时不重复上传"""
+    
+    name = 'clipboard'
+    
+    def __init__(self, uploader, emit):
+        super().__init__(uploader, emit)
+        self.interval = uploader.config.get('clipboard_poll_interval', 0.5)
+        self.stop_event = threading.Event()
+        self.last_digest = None
+        self.last_sequence = None
+        self.get_sequence = None
+        if sys.platform == 'win32':
+            import ctypes
+            # 剪贴板序列号只在内容变化时递增，读取开销极小
+            self.get_sequence = ctypes.windll.user32.GetClipboardSequenceNumber
+    
+    def start(self):
+        # 启动前已在剪贴板中的图片不上传
+        self.last_sequence = self.get_sequence() if self.get_sequence else None
+        image = self.grab()
+        self.last_digest = self.digest(image) if image else None
+        threading.Thread(target=self.loop, daemon=True).start()
+        print("📋 已监听剪贴板图片")
+    
+    def stop(self):
+        self.stop_event.set()
+    
+    def grab(self):
+        try:
+            content = ImageGrab.grabclipboard()
+        except Exception as e:
+            self.uploader.debug_print(f"读取剪贴板失败: {str(e)}")
+            return None
+        return content if isinstance(content, Image.Image) else None
+    
+    @staticmethod
+    def digest(image):
+        return hashlib.blake2b(image.tobytes(), digest_size=16).digest()
+    
+    def loop(self):
+        while not self.stop_event.wait(self.interval):
+            if self.get_sequence:
+                sequence = self.get_sequence()
+                if sequence == self.last_sequence:
+                    continue
+                self.last_sequence = sequence
+            
+            image = self.grab()
+            if image is None:
+                continue
+            digest = self.digest(image)
+            if digest == self.last_digest:
+                continue
+            self.last_digest = digest
+            self.emit(self.name, lambda image=image: image, time.monotonic())
+
+
+class FolderSource(CaptureSource, FileSystemEventHandler):
+    """监听文件夹中新写入的图片（扫描仪、截图工具保存目录等）"""
+    
+    name = 'folder'
+    extensions = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tif', '.tiff', '.webp')
+    
+    def __init__(self, uploader, emit):
+        CaptureSource.__init__(self, uploader, emit)
+        self.folder = uploader.config.get('watch_folder', '')
+        self.backlog = uploader.config.get('folder_backlog', 64)
+        self.max_failures = uploader.config.get('folder_max_failures', 10)
+        self.observer = None
+        # 有写入完成事件时只在文件关闭后读取，否则每次修改事件都尝试读取
+        self.close_events = FileClosedEvent is not None and sys.platform.startswith('linux')
+        self.lock = threading.Lock()
+        # 已出现但尚未成功读取的文件 -> 读取失败次数，即文件夹的待处理积压
+        self.pending = {}
+        # 等待读取的文件，按事件顺序；处理队列中只放一个令牌，由它逐个取出
+        self.ready = deque()
+        self.token_queued = False
+    
+    def start(self):
+        if Observer is None:
+            print("❌ 文件夹监听需要安装 watchdog: pip install watchdog")
+            return
+        if not self.folder or not Path(self.folder).is_dir():
+            print(f"❌ 监听文件夹不存在: {self.folder}")
+            return
+        self.observer = Observer()
+        self.observer.schedule(self, self.folder, recursive=False)
+        self.observer.start()
+        print(f"📁 已监听文件夹: {self.folder}")
+    
+    def stop(self):
+        if self.observer:
+            self.observer.stop()
+    
+    def is_image(self, event):
+        return not event.is_directory and event.src_path.lower().endswith(self.extensions)
+    
+    def on_created(self, event):
+        # 从别处移入的文件只有创建事件，没有写入完成事件，因此创建时也尝试读取；
+        # 还在写入的文件读取失败后留在 pending 中，等关闭或修改事件再试
+        if self.is_image(event):
+            self.submit(event.src_path)
+    
+    def on_modified(self, event):
+        # 没有写入完成事件的平台上，文件还在写入时读取会失败，下一次修改事件再重试
+        if not self.close_events and self.is_image(event) and event.src_path in self.pending:
+            self.submit(event.src_path)
+    
+    def on_closed(self, event):
+        if self.close_events and self.is_image(event):
+            self.submit(event.src_path)
+    
+    def on_moved(self, event):
+        # 很多程序先写临时文件再重命名，重命名时文件已经写完
+        if not event.is_directory and event.dest_path.lower().endswith(self.extensions):
+            self.submit(event.dest_path)
+    
+    def submit(self, path):
+        with self.lock:
+            if path not in self.pending:
+                if len(self.pending) >= self.backlog:
+                    print(f"⚠️  文件夹待处理图片超过 {self.backlog} 张，已忽略: {path}")
+                    return
+                self.pending[path] = 0
+            if path not in self.ready:
+                self.ready.append(path)
+            if self.token_queued:
+                return
+            self.token_queued = True
+        # 只排队一个令牌，图片在处理时才读取
+        self.emit(self.name, self.load_next, time.monotonic(), lightweight=True)
+    
+    def load_next(self):
+        """处理令牌：取出下一个等待读取的文件，还有剩余时重新排队令牌"""
+        with self.lock:
+            path = self.ready.popleft() if self.ready else None
+            self.token_queued = bool(self.ready)
+        if self.token_queued:
+            self.emit(self.name, self.load_next, time.monotonic(), lightweight=True)
+        if path is None:
+            return None
+        return self.load(path)
+    
+    def load(self, path):
+        """读取图片；文件尚未写完时保留在 pending 中，等下一次文件事件重试"""
+        with self.lock:
+            # 重复事件的同一个文件已经读取过
+            if path not in self.pending:
+                return None
+        try:
+            with Image.open(path) as image:
+                image.load()
+                image = image.copy()
+        except FileNotFoundError:
+            with self.lock:
+                self.pending.pop(path, None)
+            return None
+        except Exception as e:
+            with self.lock:
+                failures = self.pending.get(path, 0) + 1
+                if failures >= self.max_failures:
+                    # 损坏的文件或扩展名是图片的非图片文件，不再等待
+                    self.pending.pop(path, None)
+                elif path in self.pending:
+                    self.pending[path] = failures
+            if failures >= self.max_failures:
+                print(f"⚠️  图片连续 {failures} 次读取失败，已放弃: {path} ({str(e)})")
+            else:
+                self.uploader.debug_print(f"图片尚未写完，等待下一次文件事件: {path} ({str(e)})")
+            return None
+        with self.lock:
+            self.pending.pop(path, None)
+        return image
+
+
+class FramePool:
+    """按名称复用的 numpy 缓冲区，形状不变时不重新分配"""
+    
+    def __init__(self):
+        self.buffers = {}
+    
+    def get(self, name, shape, dtype):
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = np.empty(shape, dtype=dtype)
+            self.buffers[name] = buffer
+        return buffer
+    
+    def nbytes(self):
+        return sum(buffer.nbytes for buffer in self.buffers.values())
+
+
+def image_nbytes(image):
+    """PIL 图片像素数据占用的内存（多通道图片每像素按 4 字节存储）"""
+    return image.width * image.height * (1 if len(image.getbands()) == 1 else 4)
+
+
+class MemoryTelemetry:
+    """
+    按阶段记录 tracemalloc 快照，通过热键按需开启
+    
+    PIL 的像素数据由 C 层直接分配，tracemalloc 统计不到，因此同时输出进程 RSS。
+    """
+    
+    def __init__(self, uploader, top=5):
+        self.uploader = uploader
+        self.top = top
+        self.enabled = False
+        # 每个处理线程只与自己上一阶段的快照比较
+        self.local = threading.local()
+        # 热键线程开关统计与处理线程取快照互斥
+        self.lock = threading.Lock()
+    
+    def toggle(self):
+        with self.lock:
+            if self.enabled:
+                tracemalloc.stop()
+                self.enabled = False
+                print("🧠 内存统计已关闭")
+            else:
+                tracemalloc.start()
+                self.enabled = True
+                print("🧠 内存统计已开启，下一次截图起按阶段输出")
+    
+    def begin(self):
+        """新的一次截图开始，不与上一次比较"""
+        self.local.last_snapshot = None
+    
+    def mark(self, stage):
+        with self.lock:
+            if not self.enabled:
+                return
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+        last_snapshot = getattr(self.local, 'last_snapshot', None)
+        self.local.last_snapshot = snapshot
+        
+        rss = self.uploader.memory_usage_mb()
+        rss_text = f", RSS {rss:.0f} MB" if rss is not None else ""
+        frames = self.uploader.frame_memory_bytes() / 1048576
+        print(f"🧠 [{stage}] Python 分配 {current / 1048576:.1f} MB, 峰值 {peak / 1048576:.1f} MB, "
+              f"帧缓冲 {frames:.0f} MB{rss_text}")
+        if last_snapshot is not None:
+            for stat in snapshot.compare_to(last_snapshot, 'lineno')[:self.top]:
+                print(f"   {stat}")
+
+
+def warm_up_encoder():
+    """进程池初始化：提前加载 PIL 编码器，避免第一次截图时的冷启动"""
+    Image.new('RGB', (64, 64)).save(io.BytesIO(), format='JPEG', quality=85, optimize=True)
+
+
+def encode_shared_frame(input_name, output_name, mode, size, max_width, quality, img_format):
+    """
+    在进程池中执行：从共享内存读取原始帧，缩放编码后写回输出共享内存
+    
+    返回 (编码字节数, 宽, 高)
+    """
+    frame_shm = shared_memory.SharedMemory(name=input_name)
+    output_shm = shared_memory.SharedMemory(name=output_name)
+    image = None
+    buffer = None
+    try:
+        # 从共享内存读取原始帧（RGBA/L 直接映射，RGB 由 PIL 解包为内部格式）
+        image = Image.frombuffer(mode, size, frame_shm.buf, 'raw', mode, 0, 1)
+        
+        if image.width > max_width:
+            ratio = max_width / image.width
+            new_size = (max_width, int(image.height * ratio))
+            image = image.resize(new_size, Image.LANCZOS)
+        
+        if img_format.upper() == 'JPEG' and image.mode == 'RGBA':
+            rgb_image = Image.new('RGB', image.size, (255, 255, 255))
+            rgb_image.paste(image, mask=image.split()[-1])
+            image = rgb_image
+        
+        buffer = io.BytesIO()
+        image.save(buffer, format=img_format, quality=quality, optimize=True)
+        width, height = image.size
+        length = buffer.tell()
+        if length > output_shm.size:
+            raise ValueError("编码结果超出共享内存容量")
+        output_shm.buf[:length] = buffer.getbuffer()
+        return length, width, height
+    finally:
+        # 先释放对共享内存的引用，否则无法关闭
+        image = buffer = None
+        frame_shm.close()
+        output_shm.close()
+
+
+class SharedFrameSlot:
+    """一组输入/输出共享内存，同一时间只被一次编码使用"""
+    
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.input = shared_memory.SharedMemory(create=True, size=capacity)
+        # 编码结果一般远小于原始帧，预留余量应对无法压缩的内容
+        self.output = shared_memory.SharedMemory(create=True, size=capacity + 1048576)
+    
+    def close(self):
+        for shm in (self.input, self.output):
+            shm.close()
+            shm.unlink()
+
+
+class SharedMemoryEncoder:
+    """
+    基于常驻进程池的图片编码服务
+    
+    原始帧通过共享内存传给子进程，不经过 pickle；缩放和 JPEG 编码不占用主进程的 GIL，
+    热键监听和网络请求不受编码影响。同时进行中的编码数不超过进程数。
+    """
+    
+    def __init__(self, processes):
+        self.processes = processes
+        if os.name == 'posix':
+            # 子进程需与主进程共用 resource_tracker，否则子进程退出时会提前释放共享内存
+            from multiprocessing import resource_tracker
+            resource_tracker.ensure_running()
+        self.pool = ProcessPoolExecutor(max_workers=processes, initializer=warm_up_encoder)
+        self.free_slots = queue.Queue()
+        self.slots = []
+        for _ in range(processes):
+            self.free_slots.put(None)
+        # 启动时预热所有子进程
+        wait([self.pool.submit(os.getpid) for _ in range(processes)])
+        self.self_check()
+    
+    def self_check(self):
+        """编码纯色图片并检查像素，确认帧数据确实经共享内存传到了子进程"""
+        for mode, color in (('RGB', (200, 30, 30)), ('RGBA', (200, 30, 30, 255))):
+            encoded, _ = self.encode(Image.new(mode, (64, 64), color), 64, 95, 'JPEG')
+            pixel = Image.open(encoded).convert('RGB').getpixel((32, 32))
+            if any(abs(a - b) > 8 for a, b in zip(pixel, color)):
+                self.close()
+                raise RuntimeError(f"编码进程自检失败: {mode} {color[:3]} -> {pixel}")
+    
+    def acquire_slot(self, size):
+        """取一个空闲的共享内存槽，容量不足时重新分配"""
+        slot = self.free_slots.get()
+        if slot is None or slot.capacity < size:
+            if slot is not None:
+                self.slots.remove(slot)
+                slot.close()
+            slot = SharedFrameSlot(size)
+            self.slots.append(slot)
+        return slot
+    
+    def encode(self, image, max_width, quality, img_format):
+        """编码图片，返回 (BytesIO, (宽, 高))"""
+        if image.mode in ('LA', 'P'):
+            image = image.convert('RGBA')
+        elif image.mode not in ('RGB', 'RGBA', 'L'):
+            image = image.convert('RGB')
+        
+        size = image.width * image.height * len(image.getbands())
+        slot = self.acquire_slot(size)
+        try:
+            # 原始像素写入共享内存，子进程按名称读取，不经过 pickle
+            slot.input.buf[:size] = image.tobytes()
+            
+            future = self.pool.submit(
+                encode_shared_frame,
+                slot.input.name, slot.output.name,
+                image.mode, image.size,
+                max_width, quality, img_format
+            )
+            length, width, height = future.result()
+            return io.BytesIO(slot.output.buf[:length]), (width, height)
+        finally:
+            self.free_slots.put(slot)
+    
+    def nbytes(self):
+        return sum(slot.input.size + slot.output.size for slot in list(self.slots))
+    
+    def close(self):
+        self.pool.shutdown(wait=True)
+        for slot in self.slots:
+            slot.close()
+        self.slots = []
+
+
+def run_encoder_benchmark(frame_count=48, size=(2560, 1440)):
+    """编码吞吐量基准测试：比较本地编码与不同进程数下的每秒截图数"""
+    print(f"编码基准测试: {frame_count} 帧 {size[0]}x{size[1]}, CPU 核数 {os.cpu_count()}")
+    
+    # 生成带噪声的测试帧，接近真实截图的编码开销
+    frames = []
+    for i in range(4):
+        noise = Image.effect_noise(size, 32 + i * 8)
+        gradient = Image.linear_gradient('L').resize(size)
+        frames.append(Image.merge('RGB', (noise, gradient, noise)))
+    
+    def encode_locally(frame):
+        frame = frame.resize((1920, int(frame.height * 1920 / frame.width)), Image.LANCZOS)
+        buffer = io.BytesIO()
+        frame.save(buffer, format='JPEG', quality=85, optimize=True)
+        return buffer.tell()
+    
+    start = time.perf_counter()
+    local_sizes = [encode_locally(frames[i % len(frames)]) for i in range(frame_count)]
+    baseline = frame_count / (time.perf_counter() - start)
+    print(f"   本地编码 (单线程): {baseline:.2f} 张/秒")
+    
+    for processes in range(1, (os.cpu_count() or 1) + 1):
+        encoder = SharedMemoryEncoder(processes)
+        try:
+            with ThreadPoolExecutor(max_workers=processes) as submitters:
+                start = time.perf_counter()
+                results = list(submitters.map(
+                    lambda i: encoder.encode(frames[i % len(frames)], 1920, 85, 'JPEG'),
+                    range(frame_count)
+                ))
+                rate = frame_count / (time.perf_counter() - start)
+        finally:
+            encoder.close()
+        
+        # 编码结果大小应与本地编码一致，否则说明子进程拿到的不是真实帧数据
+        for (encoded, _), local_size in zip(results, local_sizes):
+            pool_size = encoded.getbuffer().nbytes
+            if abs(pool_size - local_size) > local_size * 0.05:
+                raise RuntimeError(f"进程池编码结果异常: {pool_size} 字节，本地编码 {local_size} 字节")
+        print(f"   进程池 {processes} 进程: {rate:.2f} 张/秒 ({rate / baseline:.2f}x)")
+
+
+CAPTURE_SOURCES = {
+    source.name: source for source in (HotkeySource, ClipboardSource, FolderSource)
+}
+
 
 class ScreenshotUploader:
     def __init__(self):
@@ -15,6 +580,35 @@ class ScreenshotUploader:
         self.bound = False
         self.openid = None
         self.code = None
+        self.monitors = {}
+        self.monitors_lock = threading.Lock()
+        # 对冲请求使用的线程池（落后的请求在后台自然结束）
+        self.request_pool = ThreadPoolExecutor(max_workers=4)
+        # 每次新截图递增，旧的结果订阅线程据此退出
+        self.watch_generation = 0
+        # 所有来源共用的处理队列；热键/剪贴板的图片优先于文件路径处理
+        self.capture_queue = queue.PriorityQueue()
+        self.capture_sequence = itertools.count()
+        # 多个处理线程并行编码，但按取出队列的顺序依次上传和订阅结果：
+        # 服务端每个用户只有一个会话，并发上传会互相覆盖分析结果
+        self.dequeue_lock = threading.Lock()
+        self.ticket_counter = itertools.count()
+        self.next_turn = 0
+        self.turn_condition = threading.Condition()
+        # 队列中持有完整图片的条目数有上限，内存占用恒定；文件路径几乎不占内存，不受此限制
+        self.image_slots = threading.BoundedSemaphore(self.config.get('capture_queue_size', 8))
+        self.sources = []
+        # 增量上传的基准：上一次上传成功的帧及其云存储 fileID
+        self.delta_reference = None
+        self.delta_reference_id = None
+        self.delta_count = 0
+        self.frame_pool = FramePool() if np is not None else None
+        # 队列中和正在处理的图片占用的字节数，常驻模式据此限制内存
+        self.held_bytes = 0
+        self.held_lock = threading.Lock()
+        self.process = psutil.Process() if psutil is not None else None
+        self.telemetry = MemoryTelemetry(self)
+        self.encoder = None
         
     def load_config(self):
         """加载配置文件"""
@@ -29,7 +623,36 @@ class ScreenshotUploader:
                 "image_quality": 85,
                 "max_width": 1920,
                 "compress_format": "JPEG",
-                "debug_mode": True
+                "debug_mode": True,
+                "hedge_enabled": True,
+                "hedge_min_delay": 0.5,
+                "hedge_default_delay": 2.0,
+                "connect_timeout": 5,
+                "read_timeout_min": 10,
+                "breaker_failure_threshold": 3,
+                "breaker_reset_timeout": 30,
+                "breaker_slow_factor": 3,
+                "breaker_slow_min": 3,
+                "stream_result": True,
+                "result_timeout": 180,
+                "sources": ["hotkey"],
+                "watch_folder": "",
+                "clipboard_poll_interval": 0.5,
+                "capture_queue_size": 8,
+                "folder_backlog": 64,
+                "folder_max_failures": 10,
+                "delta_mode": False,
+                "delta_tile_size": 64,
+                "delta_threshold": 8,
+                "delta_max_ratio": 0.5,
+                "delta_keyframe_interval": 20,
+                "delta_analyze_region": "full",
+                "daemon_mode": False,
+                "memory_limit_mb": 256,
+                "memory_soft_ratio": 0.5,
+                "memory_transient_factor": 3,
+                "telemetry_hotkey": "ctrl+f10",
+                "encoder_processes": 0
             }
             with open(config_path, 'w', encoding='utf-8') as f:
                 json.dump(default_config, f, indent=2, ensure_ascii=False)
@@ -45,6 +668,35 @@ class ScreenshotUploader:
         config.setdefault('max_width', 1920)
         config.setdefault('compress_format', 'JPEG')
         config.setdefault('debug_mode', True)
+        config.setdefault('hedge_enabled', True)
+        config.setdefault('hedge_min_delay', 0.5)
+        config.setdefault('hedge_default_delay', 2.0)
+        config.setdefault('connect_timeout', 5)
+        config.setdefault('read_timeout_min', 10)
+        config.setdefault('breaker_failure_threshold', 3)
+        config.setdefault('breaker_reset_timeout', 30)
+        config.setdefault('breaker_slow_factor', 3)
+        config.setdefault('breaker_slow_min', 3)
+        config.setdefault('stream_result', True)
+        config.setdefault('result_timeout', 180)
+        config.setdefault('sources', ['hotkey'])
+        config.setdefault('watch_folder', '')
+        config.setdefault('clipboard_poll_interval', 0.5)
+        config.setdefault('capture_queue_size', 8)
+        config.setdefault('folder_backlog', 64)
+        config.setdefault('folder_max_failures', 10)
+        config.setdefault('delta_mode', False)
+        config.setdefault('delta_tile_size', 64)
+        config.setdefault('delta_threshold', 8)
+        config.setdefault('delta_max_ratio', 0.5)
+        config.setdefault('delta_keyframe_interval', 20)
+        config.setdefault('delta_analyze_region', 'full')
+        config.setdefault('daemon_mode', False)
+        config.setdefault('memory_limit_mb', 256)
+        config.setdefault('memory_soft_ratio', 0.5)
+        config.setdefault('memory_transient_factor', 3)
+        config.setdefault('telemetry_hotkey', 'ctrl+f10')
+        config.setdefault('encoder_processes', 0)
         
         return config
     
@@ -59,6 +711,138 @@ class ScreenshotUploader:
         if self.config.get('debug_mode', False):
             print(f"[DEBUG] {message}")
     
+    def memory_usage_mb(self):
+        """当前进程常驻内存 (MB)，仅用于统计输出，未安装 psutil 时返回 None"""
+        if self.process is None:
+            return None
+        return self.process.memory_info().rss / 1048576
+    
+    def hold_bytes(self, size):
+        with self.held_lock:
+            self.held_bytes += size
+    
+    def release_bytes(self, size):
+        with self.held_lock:
+            self.held_bytes -= size
+    
+    def frame_memory_bytes(self):
+        """
+        当前持有的帧内存估算：排队和处理中的图片、处理中图片的临时副本、增量缓冲区、编码共享内存
+        
+        临时副本（缩放、转 RGB、BytesIO、写入共享内存的 tobytes、二次压缩）不逐一统计，
+        按每张处理中图片 memory_transient_factor 倍帧大小估算。
+        解释器、依赖库、网络缓冲和内存碎片不在其中，memory_limit_mb 不是进程总内存上限；
+        不使用进程 RSS：大块内存释放后 RSS 往往不会回落，会导致一直丢帧
+        """
+        total = self.held_bytes
+        if self.frame_pool is not None:
+            total += self.frame_pool.nbytes()
+        if self.encoder is not None:
+            total += self.encoder.nbytes()
+        return total
+    
+    def memory_pressure(self, extra=0):
+        """
+        常驻模式下的内存压力等级（extra 为即将加入的图片字节数）
+        
+        'ok' 正常处理，'degrade' 降低分辨率和质量，'drop' 丢弃本次截图
+        """
+        if not self.config.get('daemon_mode'):
+            return 'ok'
+        usage = (self.frame_memory_bytes() + extra) / 1048576
+        limit = self.config.get('memory_limit_mb', 256)
+        if usage > limit:
+            return 'drop'
+        if usage > limit * self.config.get('memory_soft_ratio', 0.5):
+            return 'degrade'
+        return 'ok'
+    
+    def get_monitor(self, name):
+        """获取端点监控器（按需创建）"""
+        with self.monitors_lock:
+            if name not in self.monitors:
+                self.monitors[name] = EndpointMonitor(
+                    name,
+                    failure_threshold=self.config.get('breaker_failure_threshold', 3),
+                    reset_timeout=self.config.get('breaker_reset_timeout', 30),
+                    default_p95=self.config.get('hedge_default_delay', 2.0)
+                )
+            return self.monitors[name]
+    
+    def request_timeout(self, name, ceiling):
+        """
+        (连接, 读取) 超时：连接阶段单独限制，冷启动卡住时尽快失败；
+        读取超时按观测到的 p95 收紧，样本不足时使用原来的上限
+        """
+        connect = self.config.get('connect_timeout', 5)
+        observed = self.get_monitor(name).observed_p95()
+        if observed is None:
+            return connect, ceiling
+        read = observed * self.config.get('breaker_slow_factor', 3)
+        return connect, min(ceiling, max(self.config.get('read_timeout_min', 10), read))
+    
+    def request_endpoint(self, name, method, url, hedge=False, **kwargs):
+        """
+        带延迟统计和熔断的 HTTP 请求
+        
+        hedge=True 仅用于幂等请求：超过 p95（样本不足时为 hedge_default_delay）仍未返回时，
+        再发送一个相同的请求，取先成功返回的结果。
+        成功但耗时远超观测 p95 的请求也计入熔断失败次数。
+        """
+        monitor = self.get_monitor(name)
+        if not monitor.allow_request():
+            raise CircuitOpenError(f"端点 {name} 熔断中")
+        
+        def send():
+            start = time.monotonic()
+            try:
+                response = requests.request(method, url, **kwargs)
+            except requests.exceptions.RequestException:
+                if monitor.record_failure():
+                    print(f"⚡ 端点 {name} 连续失败，已熔断 {monitor.reset_timeout} 秒")
+                raise
+            elapsed = time.monotonic() - start
+            observed = monitor.observed_p95()
+            slow = (
+                observed is not None
+                and elapsed > observed * self.config.get('breaker_slow_factor', 3)
+                and elapsed > self.config.get('breaker_slow_min', 3)
+            )
+            if response.status_code >= 500:
+                if monitor.record_failure():
+                    print(f"⚡ 端点 {name} 连续失败，已熔断 {monitor.reset_timeout} 秒")
+            elif slow:
+                self.debug_print(f"{name} 耗时 {elapsed:.2f}s，远超 p95 ({observed:.2f}s)")
+                if monitor.record_slow():
+                    print(f"⚡ 端点 {name} 连续响应过慢，已熔断 {monitor.reset_timeout} 秒")
+            else:
+                monitor.record_success(elapsed)
+            return response
+        
+        if not hedge or not self.config.get('hedge_enabled', True):
+            return send()
+        
+        delay = max(monitor.p95(), self.config.get('hedge_min_delay', 0.5))
+        first = self.request_pool.submit(send)
+        done, _ = wait([first], timeout=delay)
+        if done:
+            return first.result()
+        
+        self.debug_print(f"{name} 超过 p95 ({delay:.2f}s) 未返回，发送对冲请求")
+        second = self.request_pool.submit(send)
+        response, error = None, None
+        for future in as_completed([first, second]):
+            try:
+                response = future.result()
+            except requests.exceptions.RequestException as e:
+                error = e
+                continue
+            if response.status_code < 500:
+                return response
+        if response is None:
+            raise error
+        return response
+    
     def bind_device(self):
         """绑定设备"""
         code = input("请输入小程序显示的6位绑定码: ").strip()
@@ -75,10 +859,12 @@ class ScreenshotUploader:
             
             self.debug_print(f"发送请求数据: {{'code': '{code}'}}")
             
-            response = requests.post(
+            response = self.request_endpoint(
+                'bindClient', 'POST',
                 url,
+                hedge=True,
                 json={"code": code},
-                timeout=10,
+                timeout=(self.config.get('connect_timeout', 5), 10),
                 headers={'Content-Type': 'application/json'}
             )
             
@@ -145,7 +931,7 @@ class ScreenshotUploader:
             self.debug_print(f"堆栈跟踪: {traceback.format_exc()}")
             return None
     
-    def compress_image(self, screenshot):
+    def compress_image(self, screenshot, degrade=False):
         """压缩图片"""
         try:
             print("🔄 正在压缩图片...")
@@ -155,31 +941,49 @@ class ScreenshotUploader:
             quality = self.config.get('image_quality', 85)
             img_format = self.config.get('compress_format', 'JPEG')
             
-            self.debug_print(f"压缩参数: max_width={max_width}, quality={quality}, format={img_format}")
-            
-            # 如果图片宽度超过限制，等比例缩放
-            if screenshot.width > max_width:
-                ratio = max_width / screenshot.width
-                new_size = (max_width, int(screenshot.height * ratio))
-                screenshot = screenshot.resize(new_size, Image.LANCZOS)
-                print(f"📐 压缩后尺寸: {screenshot.width}x{screenshot.height}")
-            
-            # 转换为字节流
-            img_byte_arr = io.BytesIO()
+            # 内存紧张时降低分辨率和质量
+            if degrade:
+                max_width = max_width // 2
+                quality = min(quality, 50)
+                print(f"⚠️  内存紧张，降级压缩: max_width={max_width}, quality={quality}")
             
-            # 如果是JPEG格式，需要转换RGB模式（去除透明通道）
-            if img_format.upper() == 'JPEG' and screenshot.mode in ('RGBA', 'LA', 'P'):
-                self.debug_print(f"转换图像模式: {screenshot.mode} -> RGB")
-                # 创建白色背景
-                rgb_screenshot = Image.new('RGB', screenshot.size, (255, 255, 255))
-                if screenshot.mode == 'P':
-                    screenshot = screenshot.convert('RGBA')
-                rgb_screenshot.paste(screenshot, mask=screenshot.split()[-1] if screenshot.mode == 'RGBA' else None)
-                screenshot = rgb_screenshot
+            self.debug_print(f"压缩参数: max_width={max_width}, quality={quality}, format={img_format}")
             
-            # 保存压缩后的图片
-            screenshot.save(img_byte_arr, format=img_format, quality=quality, optimize=True)
-            img_byte_arr.seek(0)
+            # 启用进程池时，缩放和编码在子进程中完成
+            img_byte_arr = None
+            if self.encoder is not None:
+                try:
+                    img_byte_arr, new_size = self.encoder.encode(screenshot, max_width, quality, img_format)
+                    if new_size[0] != screenshot.width:
+                        print(f"📐 压缩后尺寸: {new_size[0]}x{new_size[1]}")
+                except Exception as e:
+                    print(f"⚠️  进程池编码失败，改为本地编码: {str(e)}")
+                    img_byte_arr = None
+            
+            if img_byte_arr is None:
+                # 如果图片宽度超过限制，等比例缩放
+                if screenshot.width > max_width:
+                    ratio = max_width / screenshot.width
+                    new_size = (max_width, int(screenshot.height * ratio))
+                    screenshot = screenshot.resize(new_size, Image.LANCZOS)
+                    print(f"📐 压缩后尺寸: {screenshot.width}x{screenshot.height}")
+                
+                # 转换为字节流
+                img_byte_arr = io.BytesIO()
+                
+                # 如果是JPEG格式，需要转换RGB模式（去除透明通道）
+                if img_format.upper() == 'JPEG' and screenshot.mode in ('RGBA', 'LA', 'P'):
+                    self.debug_print(f"转换图像模式: {screenshot.mode} -> RGB")
+                    # 创建白色背景
+                    rgb_screenshot = Image.new('RGB', screenshot.size, (255, 255, 255))
+                    if screenshot.mode == 'P':
+                        screenshot = screenshot.convert('RGBA')
+                    rgb_screenshot.paste(screenshot, mask=screenshot.split()[-1] if screenshot.mode == 'RGBA' else None)
+                    screenshot = rgb_screenshot
+                
+                # 保存压缩后的图片
+                screenshot.save(img_byte_arr, format=img_format, quality=quality, optimize=True)
+                img_byte_arr.seek(0)
             
             # 计算压缩后的大小
             img_bytes = img_byte_arr.getvalue()
@@ -221,10 +1025,12 @@ class ScreenshotUploader:
             self.debug_print(f"请求URL: {url}")
             self.debug_print(f"请求数据: {request_data}")
             
-            response = requests.post(
+            response = self.request_endpoint(
+                'getUploadUrl', 'POST',
                 url,
+                hedge=True,
                 json=request_data,
-                timeout=10,
+                timeout=(self.config.get('connect_timeout', 5), 10),
                 headers={'Content-Type': 'application/json'}
             )
             
@@ -280,11 +1086,12 @@ class ScreenshotUploader:
             self.debug_print(f"上传请求头: {headers}")
             
             # 直接 PUT 上传到云存储
-            upload_response = requests.put(
+            upload_response = self.request_endpoint(
+                'cosPut', 'PUT',
                 upload_url,
                 data=img_bytes,
                 headers=headers,
-                timeout=60
+                timeout=self.request_timeout('cosPut', 60)
             )
             
             self.debug_print(f"上传响应状态码: {upload_response.status_code}")
@@ -300,6 +1107,9 @@ class ScreenshotUploader:
                 print(f"响应内容: {upload_response.text}")
                 return None, None
             
+        except CircuitOpenError as e:
+            print(f"❌ {e}，跳过云存储直传")
+            return None, None
         except requests.exceptions.Timeout:
             print("❌ 上传超时")
             return None, None
@@ -424,17 +1234,195 @@ class ScreenshotUploader:
             self.debug_print(f"堆栈跟踪: {traceback.format_exc()}")
             return None, None
     
-    def upload_screenshot(self, screenshot):
-        """上传截图 - 使用二进制方式"""
+    def upload_via_cloud_storage(self, img_byte_arr):
+        """备用上传通道：云存储直传 + 通知云函数处理"""
+        file_id, openid = self.upload_to_cloud_storage(img_byte_arr)
+        if not file_id:
+            return False
+        
+        print("📤 正在通知服务器处理...")
+        
+        url = f"{self.config['cloud_base_url']}/uploadScreenshot"
+        self.debug_print(f"通知URL: {url}")
+        
+        try:
+            # 通知请求体很小，与二进制上传分开统计延迟；
+            # 每次通知都会重新触发分析，不是幂等请求，因此不做对冲
+            response = self.request_endpoint(
+                'notify', 'POST',
+                url,
+                json={
+                    "code": self.code,
+                    "fileID": file_id
+                },
+                timeout=(self.config.get('connect_timeout', 5), 30),
+                headers={'Content-Type': 'application/json'}
+            )
+        except requests.exceptions.RequestException as e:
+            print(f"❌ 通知服务器失败: {str(e)}")
+            return False
+        
+        self.debug_print(f"通知响应状态码: {response.status_code}")
+        self.debug_print(f"通知响应内容: {response.text}")
+        
+        if response.status_code != 200:
+            print(f"❌ 通知服务器失败: HTTP {response.status_code}")
+            print(f"响应内容: {response.text}")
+            return False
+        
+        result = response.json()
+        
+        if result.get('success'):
+            print("✅ 上传成功！请在小程序查看分析结果")
+            return True
+        else:
+            print(f"❌ 处理失败: {result.get('error')}")
+            return False
+    
+    def prepare_frame(self, screenshot):
+        """缩放到 max_width 并转换为 RGB，与 compress_image 的输出尺寸一致"""
+        max_width = self.config.get('max_width', 1920)
+        if screenshot.width > max_width:
+            ratio = max_width / screenshot.width
+            new_size = (max_width, int(screenshot.height * ratio))
+            screenshot = screenshot.resize(new_size, Image.LANCZOS)
+        if screenshot.mode != 'RGB':
+            screenshot = screenshot.convert('RGB')
+        return screenshot
+    
+    def changed_tiles(self, frame, reference):
+        """返回与基准帧相比发生变化的图块 (行, 列) 列表"""
+        tile_size = self.config.get('delta_tile_size', 64)
+        threshold = self.config.get('delta_threshold', 8)
+        height, width = frame.shape[:2]
+        rows = math.ceil(height / tile_size)
+        cols = math.ceil(width / tile_size)
+        
+        # uint8 上直接求绝对差，避免转换成更宽的类型；中间结果写入复用的缓冲区
+        diff = self.frame_pool.get('diff', frame.shape, np.uint8)
+        low = self.frame_pool.get('diff_low', frame.shape, np.uint8)
+        mask = self.frame_pool.get('diff_mask', frame.shape, bool)
+        np.maximum(frame, reference, out=diff)
+        np.minimum(frame, reference, out=low)
+        np.subtract(diff, low, out=diff)
+        np.greater(diff, threshold, out=mask)
+        changed = mask.any(axis=2)
+        
+        padded = np.zeros((rows * tile_size, cols * tile_size), dtype=bool)
+        padded[:height, :width] = changed
+        tiles = padded.reshape(rows, tile_size, cols, tile_size).any(axis=(1, 3))
+        return [(int(r), int(c)) for r, c in np.argwhere(tiles)], rows * cols
+    
+    def remember_frame(self, frame, file_id):
+        """把帧复制到复用的基准缓冲区，截图本身可以立即释放"""
+        self.delta_reference = self.frame_pool.get('reference', frame.shape, frame.dtype)
+        np.copyto(self.delta_reference, frame)
+        self.delta_reference_id = file_id
+    
+    def upload_delta(self, frame):
+        """
+        只上传变化的图块和清单，由云函数基于上一张图片重建
+        
+        返回 None 表示不适合增量上传（需要走完整上传）
+        """
+        reference = self.delta_reference
+        if reference is None or reference.shape != frame.shape:
+            return None
+        if self.delta_count >= self.config.get('delta_keyframe_interval', 20):
+            self.debug_print("达到关键帧间隔，上传完整图片")
+            return None
+        
+        tiles, total = self.changed_tiles(frame, reference)
+        self.telemetry.mark('delta')
+        if len(tiles) > total * self.config.get('delta_max_ratio', 0.5):
+            self.debug_print(f"变化图块过多 ({len(tiles)}/{total})，上传完整图片")
+            return None
+        
+        tile_size = self.config.get('delta_tile_size', 64)
+        height, width = frame.shape[:2]
+        request_data = {
+            "code": self.code,
+            "delta": {
+                "baseFileID": self.delta_reference_id,
+                "width": width,
+                "height": height,
+                "tileSize": tile_size,
+                "tiles": [[r, c] for r, c in tiles],
+                "analyzeRegion": self.config.get('delta_analyze_region', 'full')
+            }
+        }
+        
+        if tiles:
+            # 变化图块按行依次拼成一张图片，与云函数 rebuildFromDelta 的布局一致
+            atlas_cols = math.ceil(math.sqrt(len(tiles)))
+            atlas_rows = math.ceil(len(tiles) / atlas_cols)
+            atlas = np.zeros((atlas_rows * tile_size, atlas_cols * tile_size, 3), dtype=np.uint8)
+            for index, (r, c) in enumerate(tiles):
+                tile = frame[r * tile_size:(r + 1) * tile_size, c * tile_size:(c + 1) * tile_size]
+                y = (index // atlas_cols) * tile_size
+                x = (index % atlas_cols) * tile_size
+                atlas[y:y + tile.shape[0], x:x + tile.shape[1]] = tile
+            
+            img_byte_arr = io.BytesIO()
+            Image.fromarray(atlas).save(
+                img_byte_arr, format='JPEG',
+                quality=self.config.get('image_quality', 85), optimize=True
+            )
+            request_data["imageBase64"] = base64.b64encode(img_byte_arr.getvalue()).decode()
+            print(f"🧩 增量上传: {len(tiles)}/{total} 个图块 ({img_byte_arr.tell()/1024:.0f} KB)")
+        else:
+            print("🧩 画面无变化，复用上一张图片重新分析")
+        
+        try:
+            response = self.request_endpoint(
+                'uploadScreenshot', 'POST',
+                f"{self.config['cloud_base_url']}/uploadScreenshot",
+                json=request_data,
+                timeout=self.request_timeout('uploadScreenshot', 60),
+                headers={'Content-Type': 'application/json'}
+            )
+            result = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"⚠️  增量上传失败: {str(e)}，改为完整上传")
+            return None
+        
+        self.debug_print(f"增量上传响应: {result}")
+        
+        if not result.get('success'):
+            print(f"⚠️  增量上传失败: {result.get('error', '未知错误')}，改为完整上传")
+            return None
+        
+        # 只更新已上传的图块：低于阈值的变化没有发给服务端，基准必须与服务端的图片一致
+        for r, c in tiles:
+            region = (slice(r * tile_size, (r + 1) * tile_size), slice(c * tile_size, (c + 1) * tile_size))
+            reference[region] = frame[region]
+        self.delta_reference_id = result.get('fileID')
+        self.delta_count += 1
+        print("✅ 上传成功！请在小程序查看分析结果")
+        return True
+    
+    def upload_screenshot(self, screenshot, degrade=False, img_byte_arr=None):
+        """上传截图 - 使用二进制方式（img_byte_arr 为已编码好的图片时跳过压缩）"""
         if not self.bound:
             print("❌ 设备未绑定，请先完成绑定")
             return False
         
+        # 增量模式：只上传与上一张相比变化的图块（降级时尺寸不同，不参与增量）
+        frame = None
+        if self.config.get('delta_mode') and np is not None and not degrade and img_byte_arr is None:
+            screenshot = self.prepare_frame(screenshot)
+            frame = np.asarray(screenshot)
+            uploaded = self.upload_delta(frame)
+            if uploaded is not None:
+                return uploaded
+        
         try:
             # 压缩图片
-            img_byte_arr = self.compress_image(screenshot)
-            if not img_byte_arr:
-                return False
+            if img_byte_arr is None:
+                img_byte_arr = self.compress_image(screenshot, degrade)
+                if not img_byte_arr:
+                    return False
+                self.telemetry.mark('compress')
             
             img_bytes = img_byte_arr.getvalue()
             size_kb = len(img_bytes) / 1024
@@ -474,10 +1462,18 @@ class ScreenshotUploader:
                 
                 print(f"✅ 二次压缩完成: {size_mb:.2f} MB")
                 
+                # 尺寸已变化，不能作为增量基准
+                frame = None
+                
                 if size_mb > 5:
                     print("❌ 图片仍然过大，无法上传")
                     return False
             
+            # 二进制上传通道熔断时，直接改走云存储直传
+            if not self.get_monitor('uploadScreenshot').allow_request():
+                print("⚡ 二进制上传通道暂不可用，改用云存储直传...")
+                return self.upload_via_cloud_storage(img_byte_arr)
+            
             print(f"📤 正在上传截图... ({size_mb:.2f} MB)")
             
             # 使用二进制上传
@@ -486,14 +1482,23 @@ class ScreenshotUploader:
             self.debug_print(f"上传URL: {url}")
             self.debug_print(f"图片大小: {len(img_bytes)} bytes")
             
-            response = requests.post(
-                url,
-                data=img_bytes,
-                headers={
-                    'Content-Type': 'application/octet-stream'
-                },
-                timeout=60
-            )
+            try:
+                # 请求体较大，不做对冲，避免占用双倍上行带宽
+                response = self.request_endpoint(
+                    'uploadScreenshot', 'POST',
+                    url,
+                    data=img_bytes,
+                    headers={
+                        'Content-Type': 'application/octet-stream'
+                    },
+                    timeout=self.request_timeout('uploadScreenshot', 60)
+                )
+            except requests.exceptions.RequestException as e:
+                print(f"❌ 二进制上传失败: {str(e)}")
+                if self.get_monitor('cosPut').allow_request():
+                    print("🔁 改用云存储直传重试...")
+                    return self.upload_via_cloud_storage(img_byte_arr)
+                return False
             
             self.debug_print(f"响应状态码: {response.status_code}")
             self.debug_print(f"响应内容: {response.text}")
@@ -501,12 +1506,19 @@ class ScreenshotUploader:
             if response.status_code != 200:
                 print(f"❌ HTTP错误: {response.status_code}")
                 print(f"响应内容: {response.text}")
+                # 服务端错误与网络异常一样改走云存储直传
+                if response.status_code >= 500 and self.get_monitor('cosPut').allow_request():
+                    print("🔁 改用云存储直传重试...")
+                    return self.upload_via_cloud_storage(img_byte_arr)
                 return False
             
             result = response.json()
             
             if result.get('success'):
                 print("✅ 上传成功！请在小程序查看分析结果")
+                if frame is not None and result.get('fileID'):
+                    self.remember_frame(frame, result.get('fileID'))
+                    self.delta_count = 0
                 return True
             else:
                 error = result.get('error', '未知错误')
@@ -717,11 +1729,172 @@ class ScreenshotUploader:
             self.debug_print(f"堆栈跟踪: {traceback.format_exc()}")
             return False
     
-    def on_hotkey(self):
-        """热键回调"""
-        screenshot = self.take_screenshot()
-        if screenshot:
-            self.upload_screenshot(screenshot)
+    def watch_analysis(self, capture_time, upload_time, generation):
+        """订阅分析进度，在终端增量输出结果"""
+        url = f"{self.config['cloud_base_url']}/getAnalysisProgress"
+        deadline = time.monotonic() + self.config.get('result_timeout', 180)
+        offset = 0
+        first_token_time = None
+        
+        print("\n🤖 分析结果:")
+        
+        while time.monotonic() < deadline:
+            if generation != self.watch_generation:
+                self.debug_print("已有新的截图，停止订阅旧结果")
+                return
+            
+            try:
+                response = self.request_endpoint(
+                    'getAnalysisProgress', 'POST',
+                    url,
+                    json={"code": self.code, "offset": offset, "wait": 10000},
+                    timeout=(self.config.get('connect_timeout', 5), 20),
+                    headers={'Content-Type': 'application/json'}
+                )
+                result = response.json()
+            except (requests.exceptions.RequestException, ValueError) as e:
+                self.debug_print(f"获取分析进度失败: {str(e)}")
+                time.sleep(1)
+                continue
+            
+            # 长轮询期间可能已有新的截图重置了会话，返回的内容不属于本次截图
+            if generation != self.watch_generation:
+                self.debug_print("已有新的截图，丢弃旧订阅的结果")
+                return
+            
+            if not result.get('success'):
+                print(f"\n❌ 获取分析结果失败: {result.get('error', '未知错误')}")
+                return
+            
+            delta = result.get('delta', '')
+            if delta:
+                if first_token_time is None:
+                    first_token_time = time.monotonic()
+                sys.stdout.write(delta)
+                sys.stdout.flush()
+            offset = result.get('offset', offset)
+            
+            if result.get('done'):
+                end_time = time.monotonic()
+                if result.get('status') == 'error':
+                    print(f"\n❌ {result.get('errorMsg') or '分析失败'}")
+                    return
+                print("\n")
+                if first_token_time is not None:
+                    print(f"⏱️  首字延迟: {first_token_time - upload_time:.2f}s (上传完成后)")
+                print(f"⏱️  分析耗时: {end_time - upload_time:.2f}s")
+                print(f"⏱️  端到端耗时: {end_time - capture_time:.2f}s (截图到结果完成)")
+                return
+        
+        print("\n⚠️  等待分析结果超时，请在小程序查看")
+    
+    def emit_capture(self, source, loader, capture_time, lightweight=False):
+        """
+        来源回调：只入队不处理，不阻塞来源线程
+        
+        lightweight 的条目（文件路径）在处理时才读取图片，不占用图片队列名额
+        """
+        slot = None
+        held = 0
+        if not lightweight:
+            # 非文件路径的条目已经持有图片，loader 直接返回它
+            held = image_nbytes(loader())
+            if self.memory_pressure(held) == 'drop':
+                print(f"⚠️  内存已达上限，丢弃来自 {source} 的图片")
+                return
+            if not self.image_slots.acquire(blocking=False):
+                print(f"⚠️  待处理图片过多，已丢弃一张来自 {source} 的图片")
+                return
+            slot = self.image_slots
+            self.hold_bytes(held)
+        priority = 1 if lightweight else 0
+        self.capture_queue.put((priority, next(self.capture_sequence), source, loader, capture_time, slot, held))
+    
+    def wait_turn(self, ticket):
+        """等待轮到该截图上传"""
+        with self.turn_condition:
+            self.turn_condition.wait_for(lambda: self.next_turn == ticket)
+    
+    def finish_turn(self, ticket):
+        """该截图处理结束（包括丢弃和失败），轮到下一张"""
+        with self.turn_condition:
+            self.turn_condition.wait_for(lambda: self.next_turn == ticket)
+            self.next_turn += 1
+            self.turn_condition.notify_all()
+    
+    def capture_worker(self):
+        """处理队列中的图片；多个线程时编码并行，上传按顺序"""
+        while True:
+            with self.dequeue_lock:
+                _, _, source, loader, capture_time, slot, held = self.capture_queue.get()
+                ticket = next(self.ticket_counter)
+            image = None
+            try:
+                self.telemetry.begin()
+                image = loader()
+                if image is not None:
+                    if slot is None:
+                        # 文件路径在读取后才持有图片
+                        held = image_nbytes(image)
+                        self.hold_bytes(held)
+                    # 处理过程中的临时副本按帧大小的倍数估算，处理结束随图片一起释放
+                    transient = image_nbytes(image) * self.config.get('memory_transient_factor', 3)
+                    self.hold_bytes(transient)
+                    held += transient
+                    self.debug_print(f"处理来自 {source} 的图片")
+                    self.telemetry.mark('capture')
+                    self.handle_capture(image, capture_time, ticket)
+            except Exception as e:
+                print(f"❌ 处理图片失败: {str(e)}")
+                import traceback
+                self.debug_print(f"堆栈跟踪: {traceback.format_exc()}")
+            finally:
+                self.finish_turn(ticket)
+                # 释放本次截图的引用，常驻模式下立即回收
+                loader = image = None
+                self.release_bytes(held)
+                if slot is not None:
+                    slot.release()
+                if self.config.get('daemon_mode'):
+                    gc.collect()
+                self.capture_queue.task_done()
+    
+    def capture_worker_count(self):
+        """
+        处理线程数：启用进程池编码时可并行编码多张截图；
+        增量模式的编码依赖上一张图片，只能单线程处理
+        """
+        if self.encoder is None or self.config.get('delta_mode'):
+            return 1
+        return self.encoder.processes
+    
+    def handle_capture(self, screenshot, capture_time, ticket):
+        """编码、上传并订阅分析结果"""
+        pressure = self.memory_pressure()
+        if pressure == 'drop':
+            print(f"⚠️  帧缓冲占用 {self.frame_memory_bytes() / 1048576:.0f} MB 已达上限，丢弃本次截图")
+            return
+        degrade = pressure == 'degrade'
+        
+        # 多线程时先并行编码，再等轮到自己时上传
+        img_byte_arr = None
+        if self.capture_worker_count() > 1:
+            img_byte_arr = self.compress_image(screenshot, degrade)
+            if not img_byte_arr:
+                return
+            self.telemetry.mark('compress')
+        
+        self.wait_turn(ticket)
+        self.watch_generation += 1
+        uploaded = self.upload_screenshot(screenshot, degrade, img_byte_arr)
+        self.telemetry.mark('upload')
+        if uploaded:
+            if self.config.get('stream_result', True):
+                threading.Thread(
+                    target=self.watch_analysis,
+                    args=(capture_time, time.monotonic(), self.watch_generation),
+                    daemon=True
+                ).start()
     
     def run(self):
         """运行主程序"""
@@ -751,6 +1924,25 @@ class ScreenshotUploader:
         print(f"   格式: {self.config.get('compress_format', 'JPEG')}")
         print(f"   质量: {self.config.get('image_quality', 85)}")
         print(f"   最大宽度: {self.config.get('max_width', 1920)}px")
+        if self.config.get('daemon_mode'):
+            print(f"   常驻模式: 帧内存上限 {self.config.get('memory_limit_mb', 256)} MB"
+                  f"（估算截图及编码缓冲，不含解释器和依赖库，不是进程总内存上限）")
+        if self.config.get('delta_mode'):
+            if np is None:
+                print("   增量上传: 需要安装 numpy (pip install numpy)，已禁用")
+            else:
+                print(f"   增量上传: 已启用 (图块 {self.config.get('delta_tile_size', 64)}px)")
+        
+        # 启动编码进程池（在绑定期间完成预热）
+        processes = self.config.get('encoder_processes', 0)
+        if processes < 0:
+            processes = os.cpu_count() or 1
+        if processes > 0:
+            try:
+                self.encoder = SharedMemoryEncoder(processes)
+                print(f"   编码进程: {processes}")
+            except Exception as e:
+                print(f"   编码进程启动失败，使用本地编码: {str(e)}")
         
         # 绑定设备
         print("\n🔗 开始绑定设备...")
@@ -761,20 +1953,39 @@ class ScreenshotUploader:
                     return
             time.sleep(1)
         
-        # 注册热键
-        hotkey = self.config.get('hotkey', 'f9')
-        print(f"\n⌨️  已注册热键: {hotkey.upper()}")
-        print(f"按 {hotkey.upper()} 键进行截图上传")
-        print("按 Ctrl+C 退出程序\n")
+        # 启动图片来源
+        print()
+        for _ in range(self.capture_worker_count()):
+            threading.Thread(target=self.capture_worker, daemon=True).start()
+        for name in self.config.get('sources', ['hotkey']):
+            source_cls = CAPTURE_SOURCES.get(name)
+            if source_cls is None:
+                print(f"❌ 未知的图片来源: {name}")
+                continue
+            source = source_cls(self, self.emit_capture)
+            source.start()
+            self.sources.append(source)
         
-        keyboard.add_hotkey(hotkey, self.on_hotkey)
+        telemetry_hotkey = self.config.get('telemetry_hotkey')
+        if telemetry_hotkey:
+            keyboard.add_hotkey(telemetry_hotkey, self.telemetry.toggle)
+            print(f"🧠 按 {telemetry_hotkey.upper()} 开关内存统计")
+        print("按 Ctrl+C 退出程序\n")
         
         try:
             # 保持运行
             keyboard.wait()
         except KeyboardInterrupt:
             print("\n\n👋 程序已退出")
+        finally:
+            for source in self.sources:
+                source.stop()
+            if self.encoder is not None:
+                self.encoder.close()
 
 if __name__ == '__main__':
-    uploader = ScreenshotUploader()
-    uploader.run()
\ No newline at end of file
+    if '--benchmark' in sys.argv:
+        run_encoder_benchmark()
+    else:
+        uploader = ScreenshotUploader()
+        uploader.run()
\ No newline at end of file
@@ -0,0 +1,95 @@
+const cloud = require('wx-server-sdk');
+cloud.init({ env: cloud.DYNAMIC_CURRENT_ENV });
+const db = cloud.database();
+
+// 长轮询参数（需小于 config.json 中的云函数超时时间）
+const MAX_WAIT = 15000;
+const CHECK_INTERVAL = 200;
+
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+// 返回当前会话已生成的全部文本
+function currentText(session) {
+  if (session.status === 'completed') {
+    return session.answer || '';
+  }
+  return session.partialAnswer || '';
+}
+
+exports.main = async (event, context) => {
+  let requestData = {};
+  
+  // 处理HTTP触发器请求
+  if (event.body) {
+    try {
+      requestData = typeof event.body === 'string'
+        ? JSON.parse(event.body)
+        : event.body;
+    } catch (e) {
+      return { success: false, error: '请求格式错误' };
+    }
+  } else {
+    requestData = event;
+  }
+  
+  const { code } = requestData;
+  // 客户端已收到的字符数，只返回此后的增量
+  const offset = Math.max(parseInt(requestData.offset) || 0, 0);
+  const wait = Math.min(Math.max(parseInt(requestData.wait) || 0, 0), MAX_WAIT);
+  
+  if (!code) {
+    return { success: false, error: '缺少绑定码参数' };
+  }
+  
+  try {
+    const bindResult = await db.collection('bindings')
+      .where({ code, status: 'active' })
+      .get();
+    
+    if (bindResult.data.length === 0) {
+      return { success: false, error: '绑定码无效或已过期' };
+    }
+    
+    const binding = bindResult.data[0];
+    if (binding.expireTime < Date.now()) {
+      return { success: false, error: '绑定码已过期' };
+    }
+    
+    const deadline = Date.now() + wait;
+    
+    // 在服务端等待新内容，客户端每次只收到增量
+    while (true) {
+      const sessionResult = await db.collection('sessions')
+        .where({ openid: binding.openid })
+        .field({ status: true, answer: true, partialAnswer: true, errorMsg: true })
+        .get();
+      
+      if (sessionResult.data.length === 0) {
+        return { success: false, error: '会话不存在' };
+      }
+      
+      const session = sessionResult.data[0];
+      const text = currentText(session);
+      const done = session.status === 'completed' || session.status === 'error';
+      
+      if (text.length > offset || done || Date.now() >= deadline) {
+        return {
+          success: true,
+          status: session.status,
+          delta: text.length > offset ? text.substring(offset) : '',
+          offset: Math.max(text.length, offset),
+          done,
+          errorMsg: session.errorMsg || ''
+        };
+      }
+      
+      await sleep(CHECK_INTERVAL);
+    }
+  } catch (err) {
+    console.error('获取分析进度失败:', err);
+    return {
+      success: false,
+      error: err.message || '未知错误'
+    };
+  }
+};
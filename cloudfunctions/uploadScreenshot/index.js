@@ -24,7 +24,7 @@ exports.main = async (event, context) => {
   console.log('========== 开始处理上传请求 ==========');
   
   try {
-    let code, imageBuffer, fileID;
+    let code, imageBuffer, fileID, delta;
     
     // 解析请求参数
     if (event.body) {
@@ -37,6 +37,7 @@ exports.main = async (event, context) => {
         const requestData = typeof event.body === 'string' ? JSON.parse(event.body) : event.body;
         code = requestData.code;
         fileID = requestData.fileID;
+        delta = requestData.delta;
         if (requestData.imageBase64) {
           imageBuffer = Buffer.from(requestData.imageBase64, 'base64');
         }
@@ -44,6 +45,7 @@ exports.main = async (event, context) => {
     } else {
       code = event.code;
       fileID = event.fileID;
+      delta = event.delta;
       if (event.imageBase64) {
         imageBuffer = Buffer.from(event.imageBase64, 'base64');
       }
@@ -54,7 +56,7 @@ exports.main = async (event, context) => {
       return { success: false, error: '缺少绑定码参数' };
     }
     
-    if (!imageBuffer && !fileID) {
+    if (!imageBuffer && !fileID && !delta) {
       return { success: false, error: '缺少图片数据' };
     }
     
@@ -80,6 +82,28 @@ exports.main = async (event, context) => {
     console.log('绑定码验证通过, openid:', binding.openid);
     
     let uploadedFileID = fileID;
+    let analysisBuffer = null;
+    let imageExt = 'jpg';
+    
+    // 增量上传：基于上一张图片和变化的图块重建完整图片
+    if (delta) {
+      if (!delta.baseFileID || !delta.baseFileID.includes(`screenshots/${binding.openid}/`)) {
+        return { success: false, error: '增量上传缺少有效的基准图片' };
+      }
+      const tiles = delta.tiles || [];
+      console.log(`增量上传: ${tiles.length} 个变化图块`);
+      if (tiles.length === 0) {
+        // 画面无变化，直接复用基准图片，不重新编码
+        imageBuffer = null;
+        uploadedFileID = delta.baseFileID;
+      } else {
+        const rebuilt = await rebuildFromDelta(delta, imageBuffer);
+        imageBuffer = rebuilt.full;
+        analysisBuffer = rebuilt.region;
+        // 重建后的图片以 PNG 无损保存，作为下一次增量的基准时不会逐次损失画质
+        imageExt = 'png';
+      }
+    }
     
     // 上传图片
     if (imageBuffer) {
@@ -92,7 +116,7 @@ exports.main = async (event, context) => {
       
       const timestamp = now;
       const randomStr = Math.random().toString(36).substring(2, 8);
-      const cloudPath = `screenshots/${binding.openid}/${timestamp}_${randomStr}.jpg`;
+      const cloudPath = `screenshots/${binding.openid}/${timestamp}_${randomStr}.${imageExt}`;
       
       const uploadResult = await cloud.uploadFile({
         cloudPath: cloudPath,
@@ -107,12 +131,23 @@ exports.main = async (event, context) => {
       return { success: false, error: '缺少图片数据' };
     }
     
+    // 只分析变化区域时，单独上传裁剪后的图片；完整图片仍作为下一次增量的基准
+    let analysisFileID = uploadedFileID;
+    if (analysisBuffer) {
+      const regionResult = await cloud.uploadFile({
+        cloudPath: `screenshots/${binding.openid}/${now}_region.jpg`,
+        fileContent: analysisBuffer
+      });
+      analysisFileID = regionResult.fileID;
+      console.log('变化区域上传成功, fileID:', analysisFileID);
+    }
+    
     // **关键修复**: 更新 session 状态为处理中，并清空旧的答案
     await db.collection('sessions')
       .where({ openid: binding.openid })
       .update({
         data: {
-          imageUrl: uploadedFileID,
+          imageUrl: analysisFileID,
           status: 'processing',
           answer: '',              // 清空旧答案
           partialAnswer: '',       // 清空流式答案
@@ -127,7 +162,7 @@ exports.main = async (event, context) => {
     setImmediate(async () => {
       try {
         console.log('开始后台分析任务...');
-        await analyzeImage(binding.openid, uploadedFileID);
+        await analyzeImage(binding.openid, analysisFileID);
       } catch (err) {
         console.error('后台分析失败:', err);
       }
@@ -151,6 +186,54 @@ exports.main = async (event, context) => {
   }
 };
 
+// 根据增量清单重建完整图片
+// delta: { baseFileID, width, height, tileSize, tiles: [[row, col], ...], analyzeRegion }
+// atlasBuffer: 变化图块按行依次排列拼成的图片（tiles 非空）
+async function rebuildFromDelta(delta, atlasBuffer) {
+  const Jimp = require('jimp');
+  const { baseFileID, width, height, tileSize, tiles, analyzeRegion } = delta;
+  
+  const baseResult = await cloud.downloadFile({ fileID: baseFileID });
+  const image = await Jimp.read(baseResult.fileContent);
+  
+  if (image.bitmap.width !== width || image.bitmap.height !== height) {
+    throw new Error('基准图片尺寸不匹配');
+  }
+  
+  let minX = width, minY = height, maxX = 0, maxY = 0;
+  
+  const atlas = await Jimp.read(atlasBuffer);
+  const atlasCols = Math.ceil(Math.sqrt(tiles.length));
+  
+  tiles.forEach(([row, col], index) => {
+    const x = col * tileSize;
+    const y = row * tileSize;
+    const w = Math.min(tileSize, width - x);
+    const h = Math.min(tileSize, height - y);
+    const srcX = (index % atlasCols) * tileSize;
+    const srcY = Math.floor(index / atlasCols) * tileSize;
+    
+    image.blit(atlas, x, y, srcX, srcY, w, h);
+    
+    minX = Math.min(minX, x);
+    minY = Math.min(minY, y);
+    maxX = Math.max(maxX, x + w);
+    maxY = Math.max(maxY, y + h);
+  });
+  
+  // 未变化的图块只解码一次、无损写回，只有新图块带有一次 JPEG 损失
+  const full = await image.getBufferAsync(Jimp.MIME_PNG);
+  
+  let region = null;
+  if (analyzeRegion === 'changed') {
+    region = await image.clone()
+      .crop(minX, minY, maxX - minX, maxY - minY)
+      .getBufferAsync(Jimp.MIME_JPEG);
+  }
+  
+  return { full, region };
+}
+
 // 分析图片的异步函数（支持流式输出）
 async function analyzeImage(openid, imageUrl) {
   const axios = require('axios');